@@ -1,8 +1,15 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
-from typing import NamedTuple
+from array import array
+from collections import deque
+from collections.abc import Iterable, MutableSequence, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import accumulate, repeat
+from typing import NamedTuple, Optional
 from enum import Enum
+import os
 import re
 
 
@@ -11,23 +18,94 @@ class Direction(Enum):
     RIGHT = "right"
 
 
+class StepStorage(Enum):
+    FULL = "full"
+    COLUMNS = "columns"
+    NONE = "none"
+
+
 class RotationStep(NamedTuple):
     dial: int
     zeros: int
     extra_zeros: int = 0
 
 
+class RotationSteps(Sequence[RotationStep]):
+    def __init__(
+        self,
+        dials: Optional[Sequence[int]] = None,
+        zeros: Optional[Sequence[int]] = None,
+        extra_zeros: Optional[Sequence[int]] = None,
+    ):
+        self.dials = array("i") if dials is None else dials
+        self.zeros = array("q") if zeros is None else zeros
+        self.extra_zeros = array("q") if extra_zeros is None else extra_zeros
+
+    def __len__(self) -> int:
+        return len(self.dials)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RotationSteps(
+                memoryview(self.dials)[index],
+                memoryview(self.zeros)[index],
+                memoryview(self.extra_zeros)[index],
+            )
+
+        return RotationStep(
+            self.dials[index], self.zeros[index], self.extra_zeros[index]
+        )
+
+    def __iter__(self):
+        return map(RotationStep, self.dials, self.zeros, self.extra_zeros)
+
+    def __repr__(self) -> str:
+        return f"RotationSteps(len={len(self)})"
+
+    def append(self, step: RotationStep):
+        self.extend_columns((step.dial,), (step.zeros,), (step.extra_zeros,))
+
+    def extend_columns(
+        self, dials: Iterable[int], zeros: Iterable[int], extra_zeros: Iterable[int]
+    ):
+        self.dials.extend(dials)
+        self.zeros.extend(zeros)
+        self.extra_zeros.extend(extra_zeros)
+
+
 class RotationResult(NamedTuple):
-    steps: list[RotationStep]
+    steps: Sequence[RotationStep]
     zeros: int
 
 
+class RotationSummary(NamedTuple):
+    offset: int
+    zeros: tuple[int, ...]
+
+    def dial(self, start: int) -> int:
+        return (start + self.offset) % len(self.zeros)
+
+    def merge(self, other: "RotationSummary") -> "RotationSummary":
+        dial_size = len(self.zeros)
+        offset = (self.offset + other.offset) % dial_size
+        zeros = tuple(
+            z + other.zeros[(s + self.offset) % dial_size]
+            for s, z in enumerate(self.zeros)
+        )
+        return RotationSummary(offset, zeros)
+
+
 def find_rotation_zeros(
-    start: int, max_value: int, instructions_path: str, any_click: bool
+    start: int,
+    max_value: int,
+    instructions_path: str,
+    any_click: bool,
+    storage: StepStorage = StepStorage.FULL,
 ) -> RotationResult:
     dial = start
     zeros = 0
-    steps = [RotationStep(dial, zeros)]
+    steps = new_steps(storage)
+    steps.append(RotationStep(dial, zeros))
 
     with open(instructions_path, "r") as f:
         for line in f:
@@ -50,7 +128,189 @@ def find_rotation_zeros(
 
             steps.append(RotationStep(dial, zeros, extra_zeros))
 
-    return RotationResult(steps, zeros)
+    return RotationResult(finish_steps(steps), zeros)
+
+
+def find_rotation_zeros_batch(
+    start: int,
+    max_value: int,
+    instructions_path: str,
+    any_click: bool,
+    storage: StepStorage = StepStorage.FULL,
+    block_size: int = 1 << 16,
+) -> RotationResult:
+    dial = start
+    zeros = 0
+    steps = new_steps(storage)
+    steps.append(RotationStep(dial, zeros))
+
+    with open(instructions_path, "rb") as f:
+        while block := f.read(block_size) + f.readline():
+            offsets = parse_rotations(block)
+            if not offsets:
+                continue
+
+            dials, step_zeros, extra_zeros = rotate_offsets(
+                dial, offsets, max_value, any_click
+            )
+            step_zeros = [z + zeros for z in step_zeros]
+
+            if isinstance(steps, RotationSteps):
+                steps.extend_columns(dials, step_zeros, extra_zeros)
+            elif isinstance(steps, deque):
+                steps.append(RotationStep(dials[-1], step_zeros[-1], extra_zeros[-1]))
+            else:
+                steps.extend(map(RotationStep, dials, step_zeros, extra_zeros))
+
+            dial = dials[-1]
+            zeros = step_zeros[-1]
+
+    return RotationResult(finish_steps(steps), zeros)
+
+
+def new_steps(storage: StepStorage) -> MutableSequence[RotationStep]:
+    if storage == StepStorage.COLUMNS:
+        return RotationSteps()
+
+    if storage == StepStorage.NONE:
+        return deque[RotationStep](maxlen=1)
+
+    return list[RotationStep]()
+
+
+def finish_steps(steps: MutableSequence[RotationStep]) -> Sequence[RotationStep]:
+    if isinstance(steps, deque):
+        return list(steps)
+
+    return steps
+
+
+def rotate_offsets(
+    start: int, offsets: Sequence[int], max_value: int, any_click: bool
+) -> tuple[list[int], list[int], list[int]]:
+    dial_size = max_value + 1
+    distances = [abs(o) for o in offsets]
+    deltas = [o % dial_size if o >= 0 else -(-o % dial_size) for o in offsets]
+
+    dials = [d % dial_size for d in accumulate(deltas, initial=start)]
+    currents = dials[:-1]
+    dials = dials[1:]
+
+    wraps = [(c + d) // dial_size for c, d in zip(currents, deltas)]
+    extra_zeros = [
+        d // dial_size + (w != 0 and n != 0 and c != 0)
+        for d, w, n, c in zip(distances, wraps, dials, currents)
+    ]
+
+    if any_click:
+        step_zeros = [(n == 0) + e for n, e in zip(dials, extra_zeros)]
+    else:
+        step_zeros = [n == 0 for n in dials]
+
+    return dials, list(accumulate(step_zeros)), extra_zeros
+
+
+def parse_rotations(instructions: bytes) -> array:
+    offsets = array("q")
+
+    for direction, distance in re.findall(rb"^([LR])(\d+)$", instructions, re.M):
+        offsets.append(-int(distance) if direction == b"L" else int(distance))
+
+    return offsets
+
+
+def summarize_rotations(
+    offsets: Iterable[int], max_value: int, any_click: bool
+) -> RotationSummary:
+    dial_size = max_value + 1
+    landings = [0] * dial_size
+    click_edges = [0] * (dial_size + 1)
+    full_turns = 0
+    position = 0
+
+    for offset in offsets:
+        full_turns += abs(offset) // dial_size
+        delta = abs(offset) % dial_size
+
+        if offset >= 0:
+            low, high = dial_size - delta + 1, dial_size - 1
+        else:
+            low, high = 1, delta - 1
+            delta *= -1
+
+        if delta and low <= high:
+            first = (low - position) % dial_size
+            last = first + high - low + 1
+            click_edges[first] += 1
+
+            if last <= dial_size:
+                click_edges[last] -= 1
+            else:
+                click_edges[dial_size] -= 1
+                click_edges[0] += 1
+                click_edges[last - dial_size] -= 1
+
+        position = (position + delta) % dial_size
+        landings[-position % dial_size] += 1
+
+    if not any_click:
+        return RotationSummary(position, tuple(landings))
+
+    clicks = accumulate(click_edges[:dial_size])
+    zeros = tuple(z + c + full_turns for z, c in zip(landings, clicks))
+
+    return RotationSummary(position, zeros)
+
+
+def summarize_rotation_file(
+    instructions_path: str,
+    max_value: int,
+    any_click: bool,
+    start_byte: int = 0,
+    end_byte: Optional[int] = None,
+) -> RotationSummary:
+    with open(instructions_path, "rb") as f:
+        f.seek(start_byte)
+        size = -1 if end_byte is None else end_byte - start_byte
+        offsets = parse_rotations(f.read(size))
+
+    return summarize_rotations(offsets, max_value, any_click)
+
+
+def summarize_rotation_file_parallel(
+    instructions_path: str, max_value: int, any_click: bool, workers: int
+) -> RotationSummary:
+    bounds = split_lines(instructions_path, workers * 4)
+    empty = RotationSummary(0, (0,) * (max_value + 1))
+
+    with ProcessPoolExecutor(workers) as pool:
+        summaries = pool.map(
+            summarize_rotation_file,
+            repeat(instructions_path),
+            repeat(max_value),
+            repeat(any_click),
+            bounds[:-1],
+            bounds[1:],
+        )
+        return reduce(RotationSummary.merge, summaries, empty)
+
+
+def split_lines(path: str, chunks: int) -> list[int]:
+    size = os.path.getsize(path)
+    bounds = [0]
+
+    with open(path, "rb") as f:
+        for i in range(1, chunks):
+            f.seek(max(size * i // chunks, bounds[-1]))
+            f.readline()
+
+            if f.tell() >= size:
+                break
+
+            bounds.append(f.tell())
+
+    bounds.append(size)
+    return bounds
 
 
 def spin(
@@ -85,10 +345,28 @@ if __name__ == "__main__":
     parser.add_argument("-m", "--max-value", default=99, type=int, dest="max_value")
     parser.add_argument("-s", "--start", default=50, type=int)
     parser.add_argument("-a", "--any-click", action="store_false", dest="any_click")
+    parser.add_argument("-b", "--batch", action="store_true")
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument(
+        "--steps",
+        choices=[s.value for s in StepStorage],
+        default=StepStorage.FULL.value,
+    )
 
     args = parser.parse_args()
-    steps, rotations = find_rotation_zeros(
-        args.start, args.max_value, args.instructions_path, args.any_click
-    )
 
-    print(rotations, steps)
+    if args.workers:
+        summary = summarize_rotation_file_parallel(
+            args.instructions_path, args.max_value, args.any_click, args.workers
+        )
+        print(summary.zeros[args.start], summary.dial(args.start))
+    else:
+        find_zeros = find_rotation_zeros_batch if args.batch else find_rotation_zeros
+        steps, rotations = find_zeros(
+            args.start,
+            args.max_value,
+            args.instructions_path,
+            args.any_click,
+            StepStorage(args.steps),
+        )
+        print(rotations, steps)
@@ -1,10 +1,134 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+import mmap
+import os
 import re
+import struct
+import sys
+import time
 
+INDEX_MAGIC = b"INVIDX01"
+INDEX_HEADER = struct.Struct("=8sQQ")
 
-def scan_total_invalid_ids(id_ranges_path: str) -> int:
+
+class IdRange(NamedTuple):
+    start: int
+    end: int
+
+
+class ChunkScan(NamedTuple):
+    total: int
+    ids: int
+    seconds: float
+    worker: int
+
+
+class InvalidIdIndex:
+    def __init__(
+        self,
+        bound: int,
+        ids: memoryview,
+        prefix_sums: memoryview,
+        mapping: Optional[mmap.mmap] = None,
+    ):
+        self.bound = bound
+        self.ids = ids
+        self.prefix_sums = prefix_sums
+        self.mapping = mapping
+
+    def prefix_sum(self, i: int) -> int:
+        return self.prefix_sums[2 * i] | self.prefix_sums[2 * i + 1] << 64
+
+    def sum_range(self, start: int, end: int) -> int:
+        total = 0
+
+        if end > self.bound:
+            total += sum_invalid_ids(max(start, self.bound + 1), end)
+            end = self.bound
+
+        if start <= end:
+            low = bisect_left(self.ids, start)
+            high = bisect_right(self.ids, end)
+            total += self.prefix_sum(high) - self.prefix_sum(low)
+
+        return total
+
+    def save(self, index_path: str):
+        with open(index_path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.bound, len(self.ids)))
+            f.write(self.ids)
+            f.write(self.prefix_sums)
+
+    def close(self):
+        self.ids.release()
+        self.prefix_sums.release()
+
+        if self.mapping:
+            self.mapping.close()
+
+    @classmethod
+    def build(cls, bound: int) -> "InvalidIdIndex":
+        invalid_ids = set[int]()
+
+        for id_len in range(2, len(str(bound)) + 1):
+            for period in range(1, id_len):
+                if id_len % period != 0:
+                    continue
+
+                repeater = (10**id_len - 1) // (10**period - 1)
+                last_block = min(bound // repeater, 10**period - 1)
+                invalid_ids.update(
+                    b * repeater for b in range(10 ** (period - 1), last_block + 1)
+                )
+
+        ids = array("Q", sorted(invalid_ids))
+        prefix_sums = array("Q", [0, 0])
+        total = 0
+
+        for i in ids:
+            total += i
+            prefix_sums.extend((total & (2**64 - 1), total >> 64))
+
+        return cls(bound, memoryview(ids), memoryview(prefix_sums))
+
+    @classmethod
+    def load(cls, index_path: str) -> "InvalidIdIndex":
+        with open(index_path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, bound, count = INDEX_HEADER.unpack_from(mapping)
+        if magic != INDEX_MAGIC:
+            mapping.close()
+            raise ValueError(f"{index_path} is not an invalid ID index")
+
+        words = memoryview(mapping)[INDEX_HEADER.size :].cast("Q")
+        ids = words[:count]
+        prefix_sums = words[count : 3 * count + 2]
+
+        return cls(bound, ids, prefix_sums, mapping)
+
+    @classmethod
+    def load_or_build(cls, index_path: str, bound: int) -> "InvalidIdIndex":
+        if os.path.exists(index_path):
+            index = cls.load(index_path)
+            if index.bound >= bound:
+                return index
+
+            index.close()
+
+        index = cls.build(bound)
+        index.save(index_path)
+        return index
+
+
+def scan_total_invalid_ids(id_ranges_path: str, closed_form: bool = False) -> int:
     total_invalid_ids = 0
 
     with open(id_ranges_path, "r") as f:
@@ -18,14 +142,155 @@ def scan_total_invalid_ids(id_ranges_path: str) -> int:
                 start = int(match.group(1))
                 end = int(match.group(2))
 
-                invalid_ids = sum(
-                    i for i in range(start, end + 1) if is_invalid_id(str(i))
-                )
+                if closed_form:
+                    invalid_ids = sum_invalid_ids(start, end)
+                else:
+                    invalid_ids = sum(
+                        i for i in range(start, end + 1) if is_invalid_id(str(i))
+                    )
                 total_invalid_ids += invalid_ids
 
     return total_invalid_ids
 
 
+def scan_total_invalid_ids_indexed(id_ranges_path: str, index: InvalidIdIndex) -> int:
+    id_ranges = merge_id_ranges(read_id_ranges(id_ranges_path))
+    return sum(index.sum_range(start, end) for start, end in id_ranges)
+
+
+def scan_total_invalid_ids_parallel(
+    id_ranges_path: str, workers: int, chunk_size: Optional[int] = None
+) -> int:
+    id_ranges = merge_id_ranges(read_id_ranges(id_ranges_path))
+    total_ids = sum(end - start + 1 for start, end in id_ranges)
+
+    if not chunk_size:
+        chunk_size = max(1, -(-total_ids // (workers * 8)))
+
+    chunks = split_id_ranges(id_ranges, chunk_size)
+
+    with ProcessPoolExecutor(workers) as pool:
+        scans = list(pool.map(scan_id_chunk, chunks))
+
+    report_worker_throughput(scans)
+    return sum(scan.total for scan in scans)
+
+
+def scan_id_chunk(id_ranges: list[IdRange]) -> ChunkScan:
+    started = time.perf_counter()
+    total = 0
+    ids = 0
+
+    for start, end in id_ranges:
+        total += sum(i for i in range(start, end + 1) if is_invalid_id(str(i)))
+        ids += end - start + 1
+
+    seconds = time.perf_counter() - started
+    return ChunkScan(total, ids, seconds, os.getpid())
+
+
+def split_id_ranges(id_ranges: list[IdRange], chunk_size: int) -> list[list[IdRange]]:
+    chunks = list[list[IdRange]]()
+    chunk = list[IdRange]()
+    chunk_ids = 0
+
+    for start, end in id_ranges:
+        while start <= end:
+            piece_end = min(end, start + chunk_size - chunk_ids - 1)
+            chunk.append(IdRange(start, piece_end))
+            chunk_ids += piece_end - start + 1
+            start = piece_end + 1
+
+            if chunk_ids == chunk_size:
+                chunks.append(chunk)
+                chunk = []
+                chunk_ids = 0
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def report_worker_throughput(scans: list[ChunkScan]):
+    worker_ids = defaultdict[int, int](int)
+    worker_seconds = defaultdict[int, float](float)
+
+    for scan in scans:
+        worker_ids[scan.worker] += scan.ids
+        worker_seconds[scan.worker] += scan.seconds
+
+    for worker, ids in sorted(worker_ids.items()):
+        seconds = worker_seconds[worker]
+        rate = ids / seconds if seconds else 0
+        print(
+            f"worker {worker}: {ids} ids in {seconds:.2f}s ({rate:,.0f} ids/s)",
+            file=sys.stderr,
+        )
+
+
+def read_id_ranges(id_ranges_path: str) -> list[IdRange]:
+    with open(id_ranges_path, "r") as f:
+        return [
+            IdRange(int(match.group(1)), int(match.group(2)))
+            for match in re.finditer(r"(\d+)-(\d+)", f.read())
+        ]
+
+
+def merge_id_ranges(id_ranges: Iterable[IdRange]) -> list[IdRange]:
+    merged = list[IdRange]()
+
+    for start, end in sorted(id_ranges):
+        if start > end:
+            continue
+
+        if merged and start <= merged[-1].end + 1:
+            if end > merged[-1].end:
+                merged[-1] = IdRange(merged[-1].start, end)
+            continue
+
+        merged.append(IdRange(start, end))
+
+    return merged
+
+
+def sum_invalid_ids(start: int, end: int) -> int:
+    total = 0
+
+    for id_len in range(max(len(str(start)), 2), len(str(end)) + 1):
+        low = max(start, 10 ** (id_len - 1))
+        high = min(end, 10**id_len - 1)
+
+        if low > high:
+            continue
+
+        periods = [p for p in range(1, id_len) if id_len % p == 0]
+        exact_sums = dict[int, int]()
+
+        for period in periods:
+            periodic_sum = sum_periodic_ids(low, high, id_len, period)
+            exact_sums[period] = periodic_sum - sum(
+                exact_sums[p] for p in periods if p < period and period % p == 0
+            )
+
+        total += sum(exact_sums.values())
+
+    return total
+
+
+def sum_periodic_ids(low: int, high: int, id_len: int, period: int) -> int:
+    repeater = (10**id_len - 1) // (10**period - 1)
+
+    first_block = max(-(-low // repeater), 10 ** (period - 1))
+    last_block = min(high // repeater, 10**period - 1)
+
+    if first_block > last_block:
+        return 0
+
+    block_sum = (first_block + last_block) * (last_block - first_block + 1) // 2
+    return repeater * block_sum
+
+
 def is_invalid_id(id: str) -> bool:
     id_len = len(id)
 
@@ -46,8 +311,23 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("id_ranges_path")
     parser.add_argument("-e", "--extra-checks", action="store_false")
+    parser.add_argument("-c", "--closed-form", action="store_true")
+    parser.add_argument("-i", "--index", dest="index_path")
+    parser.add_argument("-b", "--bound", type=int, default=10**12)
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, dest="chunk_size")
 
     args = parser.parse_args()
-    total = scan_total_invalid_ids(args.id_ranges_path)
+
+    if args.workers:
+        total = scan_total_invalid_ids_parallel(
+            args.id_ranges_path, args.workers, args.chunk_size
+        )
+    elif args.index_path:
+        index = InvalidIdIndex.load_or_build(args.index_path, args.bound)
+        total = scan_total_invalid_ids_indexed(args.id_ranges_path, index)
+        index.close()
+    else:
+        total = scan_total_invalid_ids(args.id_ranges_path, args.closed_form)
 
     print(total)
@@ -1,11 +1,166 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional
+import mmap
+import os
 
 
 def find_total_joltage(batteries_path: str, number_batteries: int) -> int:
-    with open(batteries_path, "r") as f:
-        return sum(find_joltage(line.strip(), number_batteries) for line in f)
+    return find_total_joltages(batteries_path, [number_batteries])[0]
+
+
+def find_total_joltages(
+    batteries_path: str, numbers_batteries: Sequence[int]
+) -> list[int]:
+    totals = [0] * len(numbers_batteries)
+
+    with open(batteries_path, "rb") as f:
+        for line in f:
+            jolts = find_joltages(line.strip(), numbers_batteries)
+            totals = [t + j for t, j in zip(totals, jolts)]
+
+    return totals
+
+
+def find_total_joltages_mapped(
+    batteries_path: str, numbers_batteries: Sequence[int], workers: int
+) -> list[int]:
+    totals = [0] * len(numbers_batteries)
+    size = os.path.getsize(batteries_path)
+
+    if not size:
+        return totals
+
+    with open(batteries_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            width = find_bank_width(mapping)
+            bounds = split_banks(mapping, workers * 4, width)
+
+    with ProcessPoolExecutor(workers) as pool:
+        partials = pool.map(
+            sum_bank_range,
+            repeat(batteries_path),
+            bounds[:-1],
+            bounds[1:],
+            repeat(numbers_batteries),
+            repeat(width),
+        )
+
+        for partial in partials:
+            totals = [t + p for t, p in zip(totals, partial)]
+
+    return totals
+
+
+def find_bank_width(mapping: mmap.mmap) -> Optional[int]:
+    width = mapping.find(b"\n")
+
+    if width <= 0 or len(mapping) % (width + 1) != 0:
+        return None
+
+    return width
+
+
+def split_banks(mapping: mmap.mmap, chunks: int, width: Optional[int]) -> list[int]:
+    size = len(mapping)
+    bounds = [0]
+
+    for i in range(1, chunks):
+        target = max(size * i // chunks, bounds[-1])
+
+        boundary = -(-target // (width + 1)) * (width + 1) if width else target
+
+        if not boundary or mapping[boundary - 1] != ord("\n"):
+            boundary = mapping.find(b"\n", target) + 1
+
+        if boundary <= bounds[-1] or boundary >= size:
+            continue
+
+        bounds.append(boundary)
+
+    bounds.append(size)
+    return bounds
+
+
+def sum_bank_range(
+    batteries_path: str,
+    start: int,
+    end: int,
+    numbers_batteries: Sequence[int],
+    width: Optional[int],
+) -> list[int]:
+    with open(batteries_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            banks = mapping[start:end]
+
+    if width and is_uniform(banks, width):
+        return [
+            sum(
+                find_joltage_windowed(banks[row : row + width], n)
+                for row in range(0, len(banks), width + 1)
+            )
+            for n in numbers_batteries
+        ]
+
+    totals = [0] * len(numbers_batteries)
+
+    for bank in banks.split(b"\n"):
+        jolts = find_joltages(bank.strip(), numbers_batteries)
+        totals = [t + j for t, j in zip(totals, jolts)]
+
+    return totals
+
+
+def is_uniform(banks: bytes, width: int) -> bool:
+    row_ends = banks[width :: width + 1]
+    return banks.count(b"\n") == row_ends.count(b"\n") == len(row_ends)
+
+
+def find_joltage_windowed(bank: bytes, number_batteries: int) -> int:
+    if not bank or len(bank) < number_batteries:
+        return 0
+
+    jolts = 0
+    start = 0
+
+    for end in range(len(bank) - number_batteries + 1, len(bank) + 1):
+        rating = max(bank[start:end])
+        start = bank.index(rating, start, end) + 1
+        jolts = jolts * 10 + rating - 48
+
+    return jolts
+
+
+def find_joltages(bank: bytes, numbers_batteries: Sequence[int]) -> list[int]:
+    stacks = [bytearray() for _ in numbers_batteries]
+    drops = [len(bank) - n for n in numbers_batteries]
+
+    for b in bank:
+        rating = b - 48
+
+        for i, stack in enumerate(stacks):
+            while drops[i] > 0 and stack and stack[-1] < rating:
+                stack.pop()
+                drops[i] -= 1
+
+            stack.append(rating)
+
+    joltages = list[int]()
+
+    for n, stack in zip(numbers_batteries, stacks):
+        jolts = 0
+
+        if bank and len(bank) >= n:
+            for rating in stack[:n]:
+                jolts = jolts * 10 + rating
+
+        joltages.append(jolts)
+
+    return joltages
 
 
 def find_joltage(bank: str, number_batteries: int) -> int:
@@ -48,10 +203,24 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("batteries_path")
     parser.add_argument(
-        "-n", "--number-batteries", type=int, default=2, dest="number_batteries"
+        "-n",
+        "--number-batteries",
+        type=int,
+        nargs="+",
+        default=[2],
+        dest="numbers_batteries",
     )
 
+    parser.add_argument("-w", "--workers", type=int)
+
     args = parser.parse_args()
-    total = find_total_joltage(args.batteries_path, args.number_batteries)
+    totals = (
+        find_total_joltages_mapped(
+            args.batteries_path, args.numbers_batteries, args.workers
+        )
+        if args.workers
+        else find_total_joltages(args.batteries_path, args.numbers_batteries)
+    )
 
-    print(total)
+    for total in totals:
+        print(total)
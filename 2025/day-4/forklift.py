@@ -1,9 +1,15 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
-from collections import Counter
-from collections.abc import Iterable
-from typing import NamedTuple
+from collections import Counter, deque
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from operator import add
+from typing import NamedTuple, Optional
+import mmap
+import os
+import tempfile
 
 
 class Coordinate(NamedTuple):
@@ -11,6 +17,31 @@ class Coordinate(NamedTuple):
     y: int
 
 
+class RollGrid(NamedTuple):
+    cells: bytearray
+    stride: int
+    padding: int
+
+
+class StripePeel(NamedTuple):
+    removed: int
+    top_changed: bool
+    bottom_changed: bool
+
+
+NEIGHBOURHOODS = {
+    "moore": [Coordinate(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy],
+    "von-neumann": [
+        Coordinate(0, -1),
+        Coordinate(-1, 0),
+        Coordinate(1, 0),
+        Coordinate(0, 1),
+    ],
+}
+
+ROLL_CELLS = bytes(1 if c == ord("@") else 0 for c in range(256))
+
+
 def count_accessible_rolls(rolls_map_path) -> int:
     with open(rolls_map_path, "r") as f:
         max_x, max_y = 0, 0
@@ -56,6 +87,183 @@ def count_accessible_rolls(rolls_map_path) -> int:
         return accessible_rolls
 
 
+def count_accessible_rolls_dense(
+    rolls_map_path: str, threshold: int = 4, neighbourhood: str = "moore"
+) -> int:
+    with open(rolls_map_path, "rb") as f:
+        rows = f.read().splitlines()
+
+    offsets = NEIGHBOURHOODS[neighbourhood]
+    grid = build_roll_grid(rows, neighbourhood_radius(offsets))
+
+    return len(peel_rolls(grid, offsets, threshold))
+
+
+def count_accessible_rolls_striped(
+    rolls_map_path: str,
+    stripe_rows: int,
+    workers: Optional[int] = None,
+    threshold: int = 4,
+    neighbourhood: str = "moore",
+) -> int:
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_path = os.path.join(work_dir, "rolls.map")
+        width, height = copy_roll_map(rolls_map_path, work_path)
+
+        if not width or not height:
+            return 0
+
+        stripes = list(range(0, height, stripe_rows))
+        dirty = set(range(len(stripes)))
+        accessible_rolls = 0
+
+        with ProcessPoolExecutor(workers) as pool:
+            while dirty:
+                passes = sorted(dirty)
+                peels = pool.map(
+                    peel_stripe,
+                    repeat(work_path),
+                    repeat(width),
+                    (stripes[k] for k in passes),
+                    (min(stripes[k] + stripe_rows, height) for k in passes),
+                    repeat(height),
+                    repeat(threshold),
+                    repeat(neighbourhood),
+                )
+                dirty.clear()
+
+                for k, peel in zip(passes, peels):
+                    accessible_rolls += peel.removed
+
+                    if peel.top_changed and k > 0:
+                        dirty.add(k - 1)
+
+                    if peel.bottom_changed and k < len(stripes) - 1:
+                        dirty.add(k + 1)
+
+        return accessible_rolls
+
+
+def copy_roll_map(rolls_map_path: str, work_path: str) -> tuple[int, int]:
+    width, height = 0, 0
+
+    with open(rolls_map_path, "rb") as f:
+        for line in f:
+            width = max(width, len(line.rstrip(b"\r\n")))
+            height += 1
+
+    with open(rolls_map_path, "rb") as f, open(work_path, "wb") as out:
+        for line in f:
+            out.write(line.rstrip(b"\r\n").ljust(width, b"."))
+
+    return width, height
+
+
+def peel_stripe(
+    work_path: str,
+    width: int,
+    first_row: int,
+    last_row: int,
+    height: int,
+    threshold: int,
+    neighbourhood: str,
+) -> StripePeel:
+    offsets = NEIGHBOURHOODS[neighbourhood]
+    radius = neighbourhood_radius(offsets)
+
+    top = max(first_row - radius, 0)
+    bottom = min(last_row + radius, height)
+
+    with open(work_path, "r+b") as f:
+        with mmap.mmap(f.fileno(), 0) as mapping:
+            rows = [mapping[y * width : (y + 1) * width] for y in range(top, bottom)]
+            grid = build_roll_grid(rows, radius, width)
+            removed = peel_rolls(
+                grid, offsets, threshold, first_row - top, last_row - top
+            )
+
+            removed_rows = set[int]()
+            for i in removed:
+                y = i // grid.stride - radius + top
+                x = i % grid.stride - radius
+                mapping[y * width + x] = ord(".")
+                removed_rows.add(y)
+
+    return StripePeel(
+        len(removed),
+        any(y < first_row + radius for y in removed_rows),
+        any(y >= last_row - radius for y in removed_rows),
+    )
+
+
+def neighbourhood_radius(offsets: Sequence[Coordinate]) -> int:
+    return max((max(abs(dx), abs(dy)) for dx, dy in offsets), default=0)
+
+
+def build_roll_grid(
+    rows: Sequence[bytes], padding: int, width: Optional[int] = None
+) -> RollGrid:
+    if width is None:
+        width = max((len(row) for row in rows), default=0)
+
+    stride = width + 2 * padding
+    cells = bytearray(stride * (len(rows) + 2 * padding))
+
+    for y, row in enumerate(rows):
+        start = (y + padding) * stride + padding
+        cells[start : start + len(row)] = row.translate(ROLL_CELLS)
+
+    return RollGrid(cells, stride, padding)
+
+
+def peel_rolls(
+    grid: RollGrid,
+    offsets: Sequence[Coordinate],
+    threshold: int,
+    first_row: int = 0,
+    last_row: Optional[int] = None,
+) -> list[int]:
+    cells, stride, padding = grid
+    deltas = [dy * stride + dx for dx, dy in offsets]
+
+    if last_row is None:
+        last_row = len(cells) // stride - 2 * padding
+
+    low = (first_row + padding) * stride
+    high = (last_row + padding) * stride
+
+    counts = bytearray(len(cells))
+    for delta in deltas:
+        if delta >= 0:
+            shifted = cells[delta:] + bytes(delta)
+        else:
+            shifted = bytes(-delta) + cells[:delta]
+
+        counts = bytearray(map(add, counts, shifted))
+
+    worklist = deque(i for i in range(low, high) if cells[i] and counts[i] < threshold)
+    removed = list[int]()
+
+    while worklist:
+        i = worklist.popleft()
+        if not cells[i]:
+            continue
+
+        cells[i] = 0
+        removed.append(i)
+
+        for delta in deltas:
+            j = i + delta
+            if not cells[j]:
+                continue
+
+            counts[j] -= 1
+            if counts[j] == threshold - 1 and low <= j < high:
+                worklist.append(j)
+
+    return removed
+
+
 def adjacent_positions(x: int, y: int) -> Iterable[Coordinate]:
     yield Coordinate(x, y - 1)
     yield Coordinate(x, y + 1)
@@ -72,11 +280,29 @@ def adjacent_positions(x: int, y: int) -> Iterable[Coordinate]:
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("rolls_map_path")
-    # parser.add_argument(
-    #     "-n", "--number-batteries", type=int, default=2, dest="number_batteries"
-    # )
+    parser.add_argument("-d", "--dense", action="store_true")
+    parser.add_argument("-t", "--threshold", type=int, default=4)
+    parser.add_argument(
+        "-n", "--neighbourhood", choices=list(NEIGHBOURHOODS), default="moore"
+    )
+    parser.add_argument("-s", "--stripe-rows", type=int, dest="stripe_rows")
+    parser.add_argument("-w", "--workers", type=int)
 
     args = parser.parse_args()
-    total = count_accessible_rolls(args.rolls_map_path)
+
+    if args.stripe_rows:
+        total = count_accessible_rolls_striped(
+            args.rolls_map_path,
+            args.stripe_rows,
+            args.workers,
+            args.threshold,
+            args.neighbourhood,
+        )
+    elif args.dense:
+        total = count_accessible_rolls_dense(
+            args.rolls_map_path, args.threshold, args.neighbourhood
+        )
+    else:
+        total = count_accessible_rolls(args.rolls_map_path)
 
     print(total)
@@ -1,8 +1,22 @@
 #! /usr/bin/env python3
 
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+import heapq
+import os
 import re
+import struct
+import sys
+import tempfile
+import time
+
+INGREDIENT_BATCH = 1 << 16
+MERGE_FAN_IN = 64
+INTERVALS_MAGIC = b"FRESH001"
+INTERVALS_HEADER = struct.Struct("=8sQ")
 
 
 class FreshRange(NamedTuple):
@@ -13,40 +27,204 @@ class FreshRange(NamedTuple):
         return self.start <= ingredient <= self.end
 
 
-def total_possible_fresh(fresh_ranges: list[FreshRange]) -> int:
-    ranges_by_start = sorted(fresh_ranges, key=lambda r: r.start)
-    dedupe_ranges = list[FreshRange]()
+class ProgressCounter:
+    def __init__(self, label: str, every: int = 1_000_000):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.next_report = every
+        self.started = time.perf_counter()
 
-    for fresh_range in ranges_by_start:
-        prior_range = dedupe_ranges[-1] if dedupe_ranges else None
+    def add(self, count: int = 1):
+        self.count += count
+        if self.count >= self.next_report:
+            self.report()
+            self.next_report += self.every
 
-        if not prior_range:
-            dedupe_ranges.append(fresh_range)
-            continue
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0
+        print(
+            f"{self.label}: {self.count:,} ids in {elapsed:.1f}s ({rate:,.0f} ids/s)",
+            file=sys.stderr,
+        )
 
-        start, end = fresh_range
 
-        if not prior_range.in_range(start) and prior_range.start < start:
-            dedupe_ranges.append(fresh_range)
-            continue
+class IntervalIndex:
+    def __init__(self, starts: Sequence[int], ends: Sequence[int]):
+        self.starts = starts
+        self.ends = ends
 
-        if not prior_range.in_range(end):
-            dedupe_ranges.append(FreshRange(prior_range.end + 1, end))
-            continue
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __contains__(self, ingredient: int) -> bool:
+        i = bisect_right(self.starts, ingredient) - 1
+        return i >= 0 and ingredient <= self.ends[i]
+
+    def classify(self, ingredients: Sequence[int]) -> list[bool]:
+        fresh = [False] * len(ingredients)
+        order = sorted(range(len(ingredients)), key=ingredients.__getitem__)
+        i = 0
+
+        for j in order:
+            ingredient = ingredients[j]
+
+            while i < len(self.ends) and self.ends[i] < ingredient:
+                i += 1
+
+            if i == len(self.ends):
+                break
+
+            fresh[j] = self.starts[i] <= ingredient
+
+        return fresh
+
+    def count_fresh(self, ingredients: Sequence[int]) -> int:
+        return sum(self.classify(ingredients))
+
+    @classmethod
+    def from_ranges(cls, fresh_ranges: Iterable[FreshRange]) -> "IntervalIndex":
+        return IntervalSet(fresh_ranges).to_index()
+
+
+class IntervalSet:
+    def __init__(self, fresh_ranges: Iterable[FreshRange] = ()):
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.size = 0
+
+        for start, end in sorted(fresh_ranges):
+            if start > end:
+                continue
+
+            if self.ends and start <= self.ends[-1] + 1:
+                if end > self.ends[-1]:
+                    self.size += end - self.ends[-1]
+                    self.ends[-1] = end
+                continue
+
+            self.starts.append(start)
+            self.ends.append(end)
+            self.size += end - start + 1
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[FreshRange]:
+        return map(FreshRange, self.starts, self.ends)
+
+    def __contains__(self, ingredient: int) -> bool:
+        return ingredient in self.to_index()
 
-    return sum(f.end - f.start + 1 for f in dedupe_ranges if f.start <= f.end)
+    def add(self, start: int, end: int):
+        if start > end:
+            return
 
+        i = bisect_left(self.ends, start - 1)
+        j = bisect_right(self.starts, end + 1)
 
-def count_fresh_ingredients(ingredients_file: str, total_fresh: bool) -> int:
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+
+        self.size += end - start + 1 - self.span_size(i, j)
+        self.starts[i:j] = array("Q", [start])
+        self.ends[i:j] = array("Q", [end])
+
+    def remove(self, start: int, end: int):
+        if start > end:
+            return
+
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+
+        if i >= j:
+            return
+
+        kept = [
+            FreshRange(s, e)
+            for s, e in (
+                (self.starts[i], start - 1),
+                (end + 1, self.ends[j - 1]),
+            )
+            if s <= e
+        ]
+
+        self.size -= self.span_size(i, j) - sum(e - s + 1 for s, e in kept)
+        self.starts[i:j] = array("Q", (s for s, _ in kept))
+        self.ends[i:j] = array("Q", (e for _, e in kept))
+
+    def overlapping(self, start: int, end: int) -> list[FreshRange]:
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+
+        return [
+            FreshRange(max(start, self.starts[k]), min(end, self.ends[k]))
+            for k in range(i, j)
+        ]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        i = bisect_left(self.ends, start)
+        return i < len(self.starts) and self.starts[i] <= end
+
+    def overlap_size(self, start: int, end: int) -> int:
+        return sum(e - s + 1 for s, e in self.overlapping(start, end))
+
+    def span_size(self, i: int, j: int) -> int:
+        return sum(self.ends[k] - self.starts[k] + 1 for k in range(i, j))
+
+    def to_index(self) -> IntervalIndex:
+        return IntervalIndex(self.starts, self.ends)
+
+    def save(self, intervals_path: str):
+        with open(intervals_path, "wb") as f:
+            f.write(INTERVALS_HEADER.pack(INTERVALS_MAGIC, len(self.starts)))
+            self.starts.tofile(f)
+            self.ends.tofile(f)
+
+    @classmethod
+    def load(cls, intervals_path: str) -> "IntervalSet":
+        intervals = cls()
+
+        with open(intervals_path, "rb") as f:
+            magic, count = INTERVALS_HEADER.unpack(f.read(INTERVALS_HEADER.size))
+            if magic != INTERVALS_MAGIC:
+                raise ValueError(f"{intervals_path} is not a fresh interval set")
+
+            intervals.starts.fromfile(f, count)
+            intervals.ends.fromfile(f, count)
+
+        intervals.size = intervals.span_size(0, count)
+        return intervals
+
+
+def total_possible_fresh(fresh_ranges: list[FreshRange]) -> int:
+    return IntervalSet(fresh_ranges).size
+
+
+def count_fresh_ingredients(
+    ingredients_file: str,
+    total_fresh: bool,
+    indexed: bool = False,
+    database_path: Optional[str] = None,
+) -> int:
     fresh_count = 0
 
     with open(ingredients_file, "r") as f:
         fresh_ranges = list[FreshRange]()
+        if database_path and os.path.exists(database_path):
+            fresh_ranges.extend(IntervalSet.load(database_path))
+
         is_checking_freshness = False
+        index: Optional[IntervalIndex] = None
+        batch = list[int]()
 
         for line in f:
             if not line.strip():
                 is_checking_freshness = True
+                if indexed and index is None:
+                    index = IntervalIndex.from_ranges(fresh_ranges)
                 continue
 
             if not is_checking_freshness:
@@ -57,20 +235,192 @@ def count_fresh_ingredients(ingredients_file: str, total_fresh: bool) -> int:
                 continue
 
             ingredient = int(line.strip())
-            if any(f.in_range(ingredient) for f in fresh_ranges):
+
+            if index is not None:
+                batch.append(ingredient)
+                if len(batch) >= INGREDIENT_BATCH:
+                    fresh_count += index.count_fresh(batch)
+                    batch.clear()
+
+            elif any(f.in_range(ingredient) for f in fresh_ranges):
                 fresh_count += 1
 
+        if index is not None:
+            fresh_count += index.count_fresh(batch)
+
+    if database_path:
+        IntervalSet(fresh_ranges).save(database_path)
+
     if total_fresh:
         return total_possible_fresh(fresh_ranges)
 
     return fresh_count
 
 
+def count_fresh_ingredients_external(
+    ingredients_file: str,
+    memory_ids: int = 1 << 20,
+    progress_every: int = 1 << 24,
+    fan_in: int = MERGE_FAN_IN,
+) -> int:
+    # memory_ids is an approximate budget: the run buffer is a list of Python
+    # ints, so it costs a few dozen bytes per id rather than eight
+    fresh_ranges = list[FreshRange]()
+
+    with open(ingredients_file, "r") as f, tempfile.TemporaryDirectory() as work_dir:
+        for line in f:
+            if not line.strip():
+                break
+
+            match = re.match(r"^(\d+)-(\d+)$", line)
+            if match:
+                fresh_ranges.append(
+                    FreshRange(int(match.group(1)), int(match.group(2)))
+                )
+
+        index = IntervalIndex.from_ranges(fresh_ranges)
+
+        spill_paths = spill_sorted_ingredients(
+            f, work_dir, memory_ids, ProgressCounter("sorted", progress_every)
+        )
+
+        spill_paths = merge_spills(spill_paths, work_dir, memory_ids, fan_in)
+
+        block_ids = max(memory_ids // max(len(spill_paths), 1), 1)
+        sorted_ids = heapq.merge(*(read_spill(p, block_ids) for p in spill_paths))
+
+        return sweep_fresh_ingredients(
+            index, sorted_ids, ProgressCounter("swept", progress_every)
+        )
+
+
+def spill_sorted_ingredients(
+    lines: Iterable[str], work_dir: str, memory_ids: int, progress: ProgressCounter
+) -> list[str]:
+    spill_paths = list[str]()
+    buffer = list[int]()
+
+    def spill():
+        spill_path = os.path.join(work_dir, f"run-{len(spill_paths)}.bin")
+        buffer.sort()
+        with open(spill_path, "wb") as spill_file:
+            array("Q", buffer).tofile(spill_file)
+
+        spill_paths.append(spill_path)
+        progress.add(len(buffer))
+        buffer.clear()
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        buffer.append(int(line))
+        if len(buffer) >= memory_ids:
+            spill()
+
+    if buffer:
+        spill()
+
+    return spill_paths
+
+
+def merge_spills(
+    spill_paths: list[str], work_dir: str, memory_ids: int, fan_in: int
+) -> list[str]:
+    # merge runs in groups so that at most fan_in files are open at once
+    fan_in = max(fan_in, 2)
+    block_ids = max(memory_ids // (fan_in + 1), 1)
+    merge_pass = 0
+
+    while len(spill_paths) > fan_in:
+        merged_paths = list[str]()
+
+        for i in range(0, len(spill_paths), fan_in):
+            group = spill_paths[i : i + fan_in]
+            if len(group) == 1:
+                merged_paths.extend(group)
+                continue
+
+            merged_path = os.path.join(
+                work_dir, f"merge-{merge_pass}-{len(merged_paths)}.bin"
+            )
+            with open(merged_path, "wb") as merged_file:
+                block = array("Q")
+                for ingredient in heapq.merge(
+                    *(read_spill(p, block_ids) for p in group)
+                ):
+                    block.append(ingredient)
+                    if len(block) >= block_ids:
+                        block.tofile(merged_file)
+                        del block[:]
+
+                block.tofile(merged_file)
+
+            for spill_path in group:
+                os.remove(spill_path)
+
+            merged_paths.append(merged_path)
+
+        spill_paths = merged_paths
+        merge_pass += 1
+
+    return spill_paths
+
+
+def read_spill(spill_path: str, block_ids: int) -> Iterator[int]:
+    with open(spill_path, "rb") as f:
+        while True:
+            block = array("Q")
+
+            try:
+                block.fromfile(f, block_ids)
+            except EOFError:
+                yield from block
+                return
+
+            yield from block
+
+
+def sweep_fresh_ingredients(
+    index: IntervalIndex, sorted_ids: Iterable[int], progress: ProgressCounter
+) -> int:
+    fresh_count = 0
+    i = 0
+
+    for ingredient in sorted_ids:
+        progress.add()
+
+        while i < len(index.ends) and index.ends[i] < ingredient:
+            i += 1
+
+        if i == len(index.ends):
+            break
+
+        if index.starts[i] <= ingredient:
+            fresh_count += 1
+
+    progress.report()
+    return fresh_count
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("ingredients_file")
     parser.add_argument("-t", "--total", action="store_true", dest="total_fresh")
+    parser.add_argument("-i", "--indexed", action="store_true")
+    parser.add_argument("-d", "--database", dest="database_path")
+    parser.add_argument("-x", "--external", action="store_true")
+    parser.add_argument("-m", "--memory-ids", type=int, default=1 << 20)
+    parser.add_argument("-f", "--fan-in", type=int, default=MERGE_FAN_IN)
     args = parser.parse_args()
 
-    fresh_count = count_fresh_ingredients(args.ingredients_file, args.total_fresh)
+    fresh_count = (
+        count_fresh_ingredients_external(
+            args.ingredients_file, args.memory_ids, fan_in=args.fan_in
+        )
+        if args.external
+        else count_fresh_ingredients(
+            args.ingredients_file, args.total_fresh, args.indexed, args.database_path
+        )
+    )
     print(fresh_count)
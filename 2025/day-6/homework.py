@@ -3,15 +3,52 @@
 from argparse import ArgumentParser
 from collections import defaultdict
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+from typing import NamedTuple, Optional
+
+
+class CephBlock(NamedTuple):
+    operation: str
+    columns: list[bytes]
+
+
+PRODUCT_TREE_CUTOFF = 256
+PARALLEL_PRODUCT_CUTOFF = 1 << 14
 
 
 def product(values: Iterable[int], start=1) -> int:
+    factors = list(values)
+    if len(factors) >= PRODUCT_TREE_CUTOFF:
+        return start * product_tree(factors)
+
     result = start
-    for v in values:
+    for v in factors:
         result *= v
     return result
 
 
+def product_tree(factors: list[int]) -> int:
+    while len(factors) > 1:
+        paired = [a * b for a, b in zip(factors[::2], factors[1::2])]
+        if len(factors) % 2:
+            paired.append(factors[-1])
+        factors = paired
+
+    return factors[0] if factors else 1
+
+
+def parallel_product(factors: list[int], workers: int) -> int:
+    if len(factors) < PARALLEL_PRODUCT_CUTOFF:
+        return product(factors)
+
+    chunk_size = -(-len(factors) // workers)
+    chunks = [factors[i : i + chunk_size] for i in range(0, len(factors), chunk_size)]
+
+    with ProcessPoolExecutor(workers) as pool:
+        return product_tree(list(pool.map(product, chunks)))
+
+
 def parse_column(column: list[str]) -> int:
     return int("".join(column))
 
@@ -76,7 +113,56 @@ def solve_ceph_problem(homework_file: str) -> int:
     return total_answer
 
 
-def solve_homework_problem(homework_file: str) -> int:
+def solve_ceph_columnar(homework_file: str, workers: Optional[int] = None) -> int:
+    with open(homework_file, "rb") as f:
+        lines = f.read().split(b"\n")
+
+    agg_lines = [i for i, line in enumerate(lines) if line[:1] in (b"*", b"+")]
+    if not agg_lines:
+        return 0
+
+    agg_line = lines[agg_lines[-1]].decode()
+    rows = [
+        line for line in lines[: agg_lines[-1]] if line and line[:1] not in (b"*", b"+")
+    ]
+
+    width = len(rows[0]) if rows else 0
+    rows = [line for line in rows if len(line) == width]
+    cells = memoryview(b"".join(rows))
+    columns = [cells[i::width].tobytes() for i in range(width)] if width else []
+
+    blocks = split_ceph_blocks(agg_line, columns)
+
+    if workers:
+        with ProcessPoolExecutor(workers) as pool:
+            return sum(pool.map(evaluate_ceph_block, blocks))
+
+    return sum(map(evaluate_ceph_block, blocks))
+
+
+def split_ceph_blocks(agg_line: str, columns: list[bytes]) -> list[CephBlock]:
+    operators = [i for i, letter in enumerate(agg_line) if not letter.isspace()]
+    ends = [i - 1 for i in operators[1:]] + [len(agg_line)]
+
+    return [
+        CephBlock(agg_line[start], columns[start:end])
+        for start, end in zip(operators, ends)
+    ]
+
+
+def evaluate_ceph_block(block: CephBlock) -> int:
+    values = map(int, block.columns)
+
+    if block.operation == "+":
+        return sum(values)
+
+    if block.operation == "*":
+        return product(values)
+
+    return 0
+
+
+def solve_homework_problem(homework_file: str, workers: Optional[int] = None) -> int:
     total_answer = 0
 
     with open(homework_file, "r") as f:
@@ -85,6 +171,8 @@ def solve_homework_problem(homework_file: str) -> int:
             for i, value in enumerate(line.split()):
                 if value == "+":
                     total_answer += sum(v for v in columns[i])
+                elif value == "*" and workers:
+                    total_answer += parallel_product(columns[i], workers)
                 elif value == "*":
                     total_answer += product(v for v in columns[i])
                 else:
@@ -93,15 +181,55 @@ def solve_homework_problem(homework_file: str) -> int:
     return total_answer
 
 
+def solve_homework_streaming(homework_file: str) -> int:
+    total_answer = 0
+
+    with open(homework_file, "r") as f:
+        column_sums = list[int]()
+        column_products = list[int]()
+
+        for line in f:
+            tokens = line.split()
+            if not tokens:
+                continue
+
+            if tokens[0] == "+" or tokens[0] == "*":
+                for i, operation in enumerate(tokens):
+                    if operation == "+":
+                        total_answer += column_sums[i] if i < len(column_sums) else 0
+                    elif operation == "*":
+                        total_answer += (
+                            column_products[i] if i < len(column_products) else 1
+                        )
+                continue
+
+            values = [int(token) for token in tokens]
+            column_sums = [
+                s + v for s, v in zip_longest(column_sums, values, fillvalue=0)
+            ]
+            column_products = [
+                p * v for p, v in zip_longest(column_products, values, fillvalue=1)
+            ]
+
+    return total_answer
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("homework_file")
     parser.add_argument("-t", "--transpose", action="store_true")
+    parser.add_argument("-s", "--streaming", action="store_true")
+    parser.add_argument("-c", "--columnar", action="store_true")
+    parser.add_argument("-w", "--workers", type=int)
     args = parser.parse_args()
 
-    answer = (
-        solve_ceph_problem(args.homework_file)
-        if args.transpose
-        else solve_homework_problem(args.homework_file)
-    )
+    if args.transpose and args.columnar:
+        answer = solve_ceph_columnar(args.homework_file, args.workers)
+    elif args.transpose:
+        answer = solve_ceph_problem(args.homework_file)
+    elif args.streaming:
+        answer = solve_homework_streaming(args.homework_file)
+    else:
+        answer = solve_homework_problem(args.homework_file, args.workers)
+
     print(answer)
@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+
+from argparse import ArgumentParser
+from collections.abc import Callable
+from typing import NamedTuple
+import random
+import timeit
+
+from homework import product_tree
+
+
+class ProductTiming(NamedTuple):
+    operands: int
+    sequential: float
+    tree: float
+
+
+def sequential_product(factors: list[int]) -> int:
+    result = 1
+    for v in factors:
+        result *= v
+    return result
+
+
+def time_product(multiply: Callable[[list[int]], int], factors: list[int]) -> float:
+    return min(timeit.repeat(lambda: multiply(factors), number=1, repeat=3))
+
+
+def benchmark_products(bits: int, max_operands: int) -> list[ProductTiming]:
+    timings = list[ProductTiming]()
+    operands = 2
+
+    while operands <= max_operands:
+        factors = [random.getrandbits(bits) | 1 for _ in range(operands)]
+        timings.append(
+            ProductTiming(
+                operands,
+                time_product(sequential_product, factors),
+                time_product(product_tree, factors),
+            )
+        )
+        operands *= 2
+
+    return timings
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-b", "--bits", type=int, nargs="+", default=[16, 64, 1024])
+    parser.add_argument("-m", "--max-operands", type=int, default=4096)
+    args = parser.parse_args()
+
+    for bits in args.bits:
+        timings = benchmark_products(bits, args.max_operands)
+        crossover = next((t.operands for t in timings if t.tree < t.sequential), None)
+
+        print(f"{bits}-bit operands, tree wins from {crossover} operands")
+        for operands, sequential, tree in timings:
+            print(f"  {operands:>8} {sequential:>12.6f}s {tree:>12.6f}s")
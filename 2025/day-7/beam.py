@@ -1,7 +1,14 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
+from array import array
 from collections import defaultdict
+from collections.abc import MutableSequence
+from typing import Optional
+
+SPLITTER_BITS = bytes(ord("1") if c == ord("^") else ord("0") for c in range(256))
+PASSABLE_BITS = bytes(ord("1") if c in b".^" else ord("0") for c in range(256))
+INT64_MAX = 2**63 - 1
 
 
 def count_beam_splits(manifold_path: str) -> int:
@@ -16,7 +23,7 @@ def count_beam_splits(manifold_path: str) -> int:
                 beams.add(start_index)
                 continue
 
-            splitters = [c for c in line if c == "^"]
+            splitters = [i for i, c in enumerate(line) if c == "^"]
             new_splits = beams.intersection(splitters)
 
             beams.difference_update(new_splits)
@@ -37,6 +44,31 @@ def count_beam_splits(manifold_path: str) -> int:
     return total_splits
 
 
+def count_beam_splits_bitset(manifold_path: str) -> int:
+    total_splits = 0
+    beams = 0
+
+    with open(manifold_path, "rb") as f:
+        for line in f:
+            row = line.rstrip(b"\r\n")
+            if not row:
+                continue
+
+            start_index = row.find(b"S")
+            if start_index >= 0:
+                beams |= 1 << start_index
+                continue
+
+            splitters = int(row[::-1].translate(SPLITTER_BITS), 2)
+            hits = beams & splitters
+            total_splits += hits.bit_count()
+
+            row_mask = (1 << len(row)) - 1
+            beams = ((beams & ~hits) | (hits << 1) | (hits >> 1)) & row_mask
+
+    return total_splits
+
+
 def count_beam_timelines(manifold_path: str) -> int:
     beam_counts = defaultdict[int, int](int)
 
@@ -68,18 +100,115 @@ def count_beam_timelines(manifold_path: str) -> int:
     return sum(beam_counts.values())
 
 
+def count_beam_timelines_dense(
+    manifold_path: str, modulus: Optional[int] = None
+) -> int:
+    beam_counts: MutableSequence[int] = (
+        array("q") if modulus is None or modulus <= INT64_MAX // 3 else list[int]()
+    )
+    # bit i set when beam_counts[i] may be non-zero, rows without beams are skipped
+    live = 0
+    upper_bound = 0
+
+    with open(manifold_path, "rb") as f:
+        for line in f:
+            row = line.rstrip(b"\r\n")
+            if not row:
+                continue
+
+            if len(beam_counts) < len(row):
+                beam_counts.extend([0] * (len(row) - len(beam_counts)))
+
+            start_index = row.find(b"S")
+            if start_index >= 0:
+                beam_counts[start_index] = 1
+                live |= 1 << start_index
+                upper_bound += 1
+                continue
+
+            if not live:
+                continue
+
+            # beams move one column per row, so only this window can change
+            low = max((live & -live).bit_length() - 2, 0)
+            window = row[low : live.bit_length() + 1][::-1]
+            splitters = int(window.translate(SPLITTER_BITS) or b"0", 2) << low
+            splits = set_bits(live & splitters)
+            hits = [beam_counts[split] for split in splits]
+
+            upper_bound += sum(hits)
+            if (
+                modulus is None
+                and upper_bound > INT64_MAX
+                and isinstance(beam_counts, array)
+            ):
+                beam_counts = list(beam_counts)
+
+            for split in splits:
+                beam_counts[split] = 0
+
+            for split, count in zip(splits, hits):
+                for i in (split - 1, split + 1):
+                    if 0 <= i < len(row):
+                        beam_counts[i] += count
+                        if modulus is not None:
+                            beam_counts[i] %= modulus
+
+            hit_mask = live & splitters
+            live = (live & ~hit_mask) | (hit_mask << 1) | (hit_mask >> 1)
+
+            if live >> len(row):
+                beam_counts[len(row) :] = zero_counts(
+                    beam_counts, len(beam_counts) - len(row)
+                )
+
+            passable = int(window.translate(PASSABLE_BITS) or b"0", 2) << low
+            for blocked in set_bits(live & ~passable & ((1 << len(row)) - 1)):
+                beam_counts[blocked] = 0
+
+            live &= passable
+
+    total = sum(beam_counts)
+    return total if modulus is None else total % modulus
+
+
+def set_bits(mask: int) -> list[int]:
+    bits = bin(mask)[:1:-1]
+    indices = list[int]()
+
+    i = bits.find("1")
+    while i >= 0:
+        indices.append(i)
+        i = bits.find("1", i + 1)
+
+    return indices
+
+
+def zero_counts(beam_counts: MutableSequence[int], count: int) -> MutableSequence[int]:
+    return (
+        array("q", bytes(8 * count)) if isinstance(beam_counts, array) else [0] * count
+    )
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("manifold_file")
     parser.add_argument(
         "-t", "--timelines", action="store_true", dest="count_timelines"
     )
+    parser.add_argument("-b", "--bitset", action="store_true")
+    parser.add_argument("-d", "--dense", action="store_true")
+    parser.add_argument("-m", "--modulus", type=int)
 
     args = parser.parse_args()
-    answer = (
-        count_beam_splits(args.manifold_file)
-        if not args.count_timelines
-        else count_beam_timelines(args.manifold_file)
-    )
+
+    if args.count_timelines and (args.dense or args.modulus):
+        answer = count_beam_timelines_dense(args.manifold_file, args.modulus)
+    elif args.count_timelines:
+        answer = count_beam_timelines(args.manifold_file)
+    elif args.bitset:
+        answer = count_beam_splits_bitset(args.manifold_file)
+    else:
+        answer = count_beam_splits(args.manifold_file)
 
     print(answer)
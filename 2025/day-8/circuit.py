@@ -1,10 +1,24 @@
 #! /usr/bin/env python3
 
-from collections.abc import Iterable
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+from functools import cache
 from typing import NamedTuple, Optional
 from argparse import ArgumentParser
+from array import array
+from itertools import chain, islice, repeat
+import heapq
+import os
 import re
 import math
+import struct
 
 
 class Position(NamedTuple):
@@ -24,6 +38,287 @@ class ConnectionMap(NamedTuple):
     last_pair: Optional[tuple[Position, Position]]
 
 
+class BoxLink(NamedTuple):
+    a: int
+    b: int
+    distance_sq: int
+
+
+class Tile(NamedTuple):
+    row_start: int
+    row_end: int
+    column_start: int
+    column_end: int
+
+
+Cell = tuple[int, int, int]
+
+# per-process worker state, set by load_tile_axes in each pool worker
+TILE_AXES = tuple[array, ...]()
+
+GRID_SPARSITY = 64
+GRID_DENSITY = 8
+NETWORK_MAGIC = b"CIRCNET1"
+NETWORK_HEADER = struct.Struct("=8sQQQ")
+
+
+class CircuitSummary(NamedTuple):
+    sizes: list[int]
+    last_pair: Optional[PositionPair]
+
+
+class DisjointSet:
+    def __init__(self, size: int):
+        self.parents = array("i", range(size))
+        self.sizes = array("i", [1]) * size
+        self.count = size
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        while self.parents[i] != root:
+            self.parents[i], i = root, self.parents[i]
+
+        return root
+
+    def union(self, a: int, b: int) -> bool:
+        a = self.find(a)
+        b = self.find(b)
+
+        if a == b:
+            return False
+
+        if self.sizes[a] < self.sizes[b]:
+            a, b = b, a
+
+        self.parents[b] = a
+        self.sizes[a] += self.sizes[b]
+        self.count -= 1
+        return True
+
+    def circuit_sizes(self) -> list[int]:
+        return [self.sizes[i] for i in range(len(self.parents)) if self.parents[i] == i]
+
+
+class BoxGrid:
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells = defaultdict[Cell, list[int]](list)
+        self.boxes = list[Position]()
+        self.low: Optional[Cell] = None
+        self.high: Optional[Cell] = None
+
+    def add(self, box: Position) -> int:
+        box_id = len(self.boxes)
+        cell = self.cell(box)
+
+        self.boxes.append(box)
+        self.cells[cell].append(box_id)
+
+        if self.low is None or self.high is None:
+            self.low = self.high = cell
+        else:
+            self.low = Cell(map(min, self.low, cell))
+            self.high = Cell(map(max, self.high, cell))
+
+        return box_id
+
+    def cell(self, box: Position) -> Cell:
+        return Cell(c // self.cell_size for c in box)
+
+    def nearest(self, box: Position) -> Iterator[tuple[int, int]]:
+        if self.low is None or self.high is None:
+            return
+
+        x, y, z = box
+        cx, cy, cz = center = self.cell(box)
+        max_ring = max(
+            max(c - low, high - c) for c, low, high in zip(center, self.low, self.high)
+        )
+        candidates = list[tuple[int, int]]()
+
+        for ring in range(max_ring + 2):
+            if ring <= max_ring:
+                for dx, dy, dz in ring_offsets(ring):
+                    for box_id in self.cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        bx, by, bz = self.boxes[box_id]
+                        distance_sq = (x - bx) ** 2 + (y - by) ** 2 + (z - bz) ** 2
+                        heapq.heappush(candidates, (distance_sq, box_id))
+
+                reach = self.explored_reach(box, center, ring) ** 2
+            else:
+                reach = math.inf
+
+            while candidates and candidates[0][0] < reach:
+                yield heapq.heappop(candidates)
+
+    @property
+    def cell_volume(self) -> int:
+        if self.low is None or self.high is None:
+            return 0
+
+        return math.prod(high - low + 1 for low, high in zip(self.low, self.high))
+
+    def explored_reach(self, box: Position, center: Cell, ring: int) -> int:
+        return min(
+            min(v - (c - ring) * self.cell_size, (c + ring + 1) * self.cell_size - v)
+            for v, c in zip(box, center)
+        )
+
+    @classmethod
+    def from_boxes(cls, junction_boxes: list[Position]) -> "BoxGrid":
+        grid = cls(fit_cell_size(junction_boxes))
+        for box in junction_boxes:
+            grid.add(box)
+
+        return grid
+
+
+class CircuitNetwork:
+    def __init__(self, cell_size: int):
+        self.grid = BoxGrid(cell_size)
+        self.links = list[BoxLink]()
+        self.regridded_at = 0
+
+    @property
+    def boxes(self) -> list[Position]:
+        return self.grid.boxes
+
+    @property
+    def is_spanning(self) -> bool:
+        return len(self.links) == len(self.boxes) - 1
+
+    @property
+    def last_pair(self) -> Optional[PositionPair]:
+        if not self.links or not self.is_spanning:
+            return None
+
+        return link_pair(self.boxes, self.links[-1])
+
+    def add_box(self, box: Position) -> int:
+        longest = math.inf
+        if self.links and self.is_spanning:
+            longest = self.links[-1].distance_sq
+
+        box_id = len(self.boxes)
+        self.grid.add(box)
+        num_boxes = len(self.boxes)
+
+        if self.grid.cell_volume > GRID_SPARSITY * num_boxes:
+            self.regrid(fit_cell_size(self.boxes))
+        elif (
+            num_boxes > GRID_DENSITY * len(self.grid.cells)
+            and num_boxes >= 2 * self.regridded_at
+            and self.grid.cell_size > 1
+        ):
+            # crowded cells make nearest() linear, shrink them as boxes pile up
+            self.regrid(min(fit_cell_size(self.boxes), self.grid.cell_size // 2))
+
+        candidates = list[BoxLink]()
+        for distance_sq, j in self.grid.nearest(box):
+            if candidates and distance_sq > max(longest, candidates[0].distance_sq):
+                break
+
+            if j != box_id:
+                candidates.append(BoxLink(j, box_id, distance_sq))
+
+        circuits = DisjointSet(len(self.boxes))
+        merged = heapq.merge(self.links, candidates, key=link_order)
+        self.links = [link for link in merged if circuits.union(link.a, link.b)]
+
+        return box_id
+
+    def regrid(self, cell_size: int):
+        grid = BoxGrid(cell_size)
+        for box in self.boxes:
+            grid.add(box)
+
+        self.grid = grid
+        self.regridded_at = len(self.boxes)
+
+    def circuit_sizes(self, num_connections: Optional[int] = None) -> list[int]:
+        links: Iterable[BoxLink] = self.links
+        if num_connections:
+            links = islice(nearest_links(self.grid), num_connections)
+
+        circuits = DisjointSet(len(self.boxes))
+        for a, b, _ in links:
+            circuits.union(a, b)
+
+        return circuits.circuit_sizes()
+
+    def save(self, network_path: str):
+        with open(network_path, "wb") as f:
+            f.write(
+                NETWORK_HEADER.pack(
+                    NETWORK_MAGIC,
+                    self.grid.cell_size,
+                    len(self.boxes),
+                    len(self.links),
+                )
+            )
+            array("q", chain.from_iterable(self.boxes)).tofile(f)
+            array("q", chain.from_iterable(self.links)).tofile(f)
+
+    @classmethod
+    def load(cls, network_path: str) -> "CircuitNetwork":
+        with open(network_path, "rb") as f:
+            magic, cell_size, num_boxes, num_links = NETWORK_HEADER.unpack(
+                f.read(NETWORK_HEADER.size)
+            )
+            if magic != NETWORK_MAGIC:
+                raise ValueError(f"{network_path} is not a circuit network")
+
+            boxes = array("q")
+            boxes.fromfile(f, 3 * num_boxes)
+            links = array("q")
+            links.fromfile(f, 3 * num_links)
+
+        network = cls(cell_size)
+        for i in range(0, len(boxes), 3):
+            network.grid.add(Position(*boxes[i : i + 3]))
+
+        network.links = [BoxLink(*links[i : i + 3]) for i in range(0, len(links), 3)]
+        return network
+
+    @classmethod
+    def from_boxes(cls, junction_boxes: list[Position]) -> "CircuitNetwork":
+        network = cls(BoxGrid.from_boxes(junction_boxes).cell_size)
+        for box in junction_boxes:
+            network.grid.add(box)
+
+        network.links = spanning_links(junction_boxes)
+        return network
+
+
+def fit_cell_size(junction_boxes: list[Position]) -> int:
+    # about one box per cell across the bounding box
+    volume = math.prod(max(c) - min(c) + 1 for c in zip(*junction_boxes))
+    return max(1, round((volume / max(len(junction_boxes), 1)) ** (1 / 3)))
+
+
+@cache
+def ring_offsets(ring: int) -> list[Cell]:
+    offsets = list[Cell]()
+
+    for dx in range(-ring, ring + 1):
+        for dy in range(-ring, ring + 1):
+            if abs(dx) == ring or abs(dy) == ring:
+                dzs: Iterable[int] = range(-ring, ring + 1)
+            else:
+                dzs = (-ring, ring) if ring else (0,)
+
+            offsets.extend(Cell((dx, dy, dz)) for dz in dzs)
+
+    return offsets
+
+
+def squared_distance(a: Position, b: Position) -> int:
+    return (a.x - b.x) ** 2 + (a.y - b.y) ** 2 + (a.z - b.z) ** 2
+
+
 def product(values: Iterable[int], start=1) -> int:
     result = start
     for v in values:
@@ -108,19 +403,267 @@ def wire_junction_boxes(
     return ConnectionMap(connections, last_pair)
 
 
+def link_junction_boxes(junction_boxes: list[Position]) -> list[BoxLink]:
+    links = list[BoxLink]()
+    for i, a in enumerate(junction_boxes):
+        for j in range(i + 1, len(junction_boxes)):
+            distance_sq = squared_distance(a, junction_boxes[j])
+            if distance_sq != 0:
+                links.append(BoxLink(i, j, distance_sq))
+
+    links.sort(key=lambda l: l.distance_sq)
+    return links
+
+
+def nearest_links(grid: BoxGrid) -> Iterator[BoxLink]:
+    streams = list[Iterator[tuple[int, int]]]()
+    frontier = list[tuple[int, int, int]]()
+
+    for i, box in enumerate(grid.boxes):
+        stream = (
+            (distance_sq, j)
+            for distance_sq, j in grid.nearest(box)
+            if j > i and distance_sq != 0
+        )
+        streams.append(stream)
+
+        nearest = next(stream, None)
+        if nearest:
+            frontier.append((nearest[0], i, nearest[1]))
+
+    heapq.heapify(frontier)
+
+    while frontier:
+        distance_sq, i, j = heapq.heappop(frontier)
+        yield BoxLink(i, j, distance_sq)
+
+        nearest = next(streams[i], None)
+        if nearest:
+            heapq.heappush(frontier, (nearest[0], i, nearest[1]))
+
+
+def top_links_blocked(
+    junction_boxes: list[Position],
+    num_connections: int,
+    tile_size: int = 512,
+    workers: Optional[int] = None,
+) -> list[BoxLink]:
+    axes = tuple(array("q", axis) for axis in zip(*junction_boxes))
+    count = len(junction_boxes)
+
+    tiles = iter_tiles(count, tile_size)
+
+    if workers:
+        with ProcessPoolExecutor(
+            workers, initializer=load_tile_axes, initargs=(axes,)
+        ) as pool:
+            tile_links = map_tiles_bounded(pool, tiles, num_connections, 2 * workers)
+            top_links = merge_top_links(tile_links, num_connections)
+    else:
+        load_tile_axes(axes)
+        tile_links = map(top_tile_links, tiles, repeat(num_connections))
+        top_links = merge_top_links(tile_links, num_connections)
+
+    return [BoxLink(a, b, distance_sq) for distance_sq, a, b in top_links]
+
+
+def iter_tiles(count: int, tile_size: int) -> Iterator[Tile]:
+    for i in range(0, count, tile_size):
+        for j in range(i, count, tile_size):
+            yield Tile(i, min(i + tile_size, count), j, min(j + tile_size, count))
+
+
+def map_tiles_bounded(
+    pool: ProcessPoolExecutor,
+    tiles: Iterator[Tile],
+    num_connections: int,
+    window: int,
+) -> Iterator[list[tuple[int, int, int]]]:
+    # keep at most window tiles in flight, yielding results as they finish
+    pending = set[Future[list[tuple[int, int, int]]]]()
+
+    for tile in tiles:
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+        pending.add(pool.submit(top_tile_links, tile, num_connections))
+
+    for future in as_completed(pending):
+        yield future.result()
+
+
+def load_tile_axes(axes: tuple[array, ...]):
+    global TILE_AXES
+    TILE_AXES = axes
+
+
+def top_tile_links(tile: Tile, num_connections: int) -> list[tuple[int, int, int]]:
+    xs, ys, zs = TILE_AXES
+
+    def tile_distances() -> Iterator[tuple[int, int, int]]:
+        for i in range(tile.row_start, tile.row_end):
+            x, y, z = xs[i], ys[i], zs[i]
+            columns = range(max(i + 1, tile.column_start), tile.column_end)
+
+            for j, distance_sq in zip(
+                columns,
+                [
+                    (x - xs[j]) ** 2 + (y - ys[j]) ** 2 + (z - zs[j]) ** 2
+                    for j in columns
+                ],
+            ):
+                if distance_sq:
+                    yield distance_sq, i, j
+
+    return heapq.nsmallest(num_connections, tile_distances())
+
+
+def merge_top_links(
+    tile_links: Iterable[list[tuple[int, int, int]]], num_connections: int
+) -> list[tuple[int, int, int]]:
+    top_links = list[tuple[int, int, int]]()
+
+    for links in tile_links:
+        top_links = heapq.nsmallest(num_connections, chain(top_links, links))
+
+    return top_links
+
+
+def span_junction_boxes(junction_boxes: list[Position]) -> CircuitSummary:
+    links = spanning_links(junction_boxes)
+    if not links:
+        return CircuitSummary([1] * len(junction_boxes), None)
+
+    return CircuitSummary([len(junction_boxes)], link_pair(junction_boxes, links[-1]))
+
+
+def spanning_links(junction_boxes: list[Position]) -> list[BoxLink]:
+    if len(junction_boxes) < 2:
+        return []
+
+    # keys are (distance_sq, low id, high id), the order Kruskal visits links in
+    best = [(math.inf, 0, 0)] * len(junction_boxes)
+    remaining = list(range(1, len(junction_boxes)))
+    current = 0
+    links = list[BoxLink]()
+
+    while remaining:
+        box = junction_boxes[current]
+        next_index = 0
+
+        for k, j in enumerate(remaining):
+            distance_sq = squared_distance(box, junction_boxes[j])
+            if distance_sq <= best[j][0]:
+                key = (
+                    (distance_sq, current, j)
+                    if current < j
+                    else (distance_sq, j, current)
+                )
+                if key < best[j]:
+                    best[j] = key
+
+            if best[j] < best[remaining[next_index]]:
+                next_index = k
+
+        current = remaining[next_index]
+        remaining[next_index] = remaining[-1]
+        remaining.pop()
+
+        distance_sq, a, b = best[current]
+        links.append(BoxLink(a, b, int(distance_sq)))
+
+    links.sort(key=link_order)
+    return links
+
+
+def link_order(link: BoxLink) -> tuple[int, int, int]:
+    return link.distance_sq, link.a, link.b
+
+
+def link_pair(junction_boxes: list[Position], link: BoxLink) -> PositionPair:
+    a, b, distance_sq = link
+    return PositionPair(junction_boxes[a], junction_boxes[b], math.sqrt(distance_sq))
+
+
+def connect_junction_boxes(
+    junction_boxes: list[Position],
+    links: Iterable[BoxLink],
+    num_connections: Optional[int],
+) -> CircuitSummary:
+    circuits = DisjointSet(len(junction_boxes))
+    last_pair: Optional[PositionPair] = None
+
+    if num_connections:
+        links = islice(links, num_connections)
+
+    for a, b, distance_sq in links:
+        if not circuits.union(a, b):
+            continue
+
+        if circuits.count == 1:
+            last_pair = link_pair(junction_boxes, BoxLink(a, b, distance_sq))
+            break
+
+    return CircuitSummary(circuits.circuit_sizes(), last_pair)
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("junctions_file")
     parser.add_argument("-c", "--connections", type=int)
     parser.add_argument("-t", "--top", type=int)
+    parser.add_argument("-u", "--union-find", action="store_true")
+    parser.add_argument("-g", "--grid", action="store_true")
+    parser.add_argument("-b", "--blocked", action="store_true")
+    parser.add_argument("--tile-size", type=int, default=512, dest="tile_size")
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("-n", "--network", dest="network_path")
 
     args = parser.parse_args()
 
     boxes = read_junction_boxes(args.junctions_file)
-    connections, last_pair = wire_junction_boxes(boxes, args.connections)
 
-    if args.top:
+    if args.network_path and os.path.exists(args.network_path):
+        network = CircuitNetwork.load(args.network_path)
+        known_boxes = set(network.boxes)
+
+        for box in boxes:
+            if box not in known_boxes:
+                network.add_box(box)
+                known_boxes.add(box)
+
+        network.save(args.network_path)
+        connection_lens = network.circuit_sizes(args.connections)
+        last_pair = network.last_pair
+    elif args.network_path:
+        network = CircuitNetwork.from_boxes(list(dict.fromkeys(boxes)))
+        network.save(args.network_path)
+        connection_lens = network.circuit_sizes(args.connections)
+        last_pair = network.last_pair
+    elif args.blocked and args.connections:
+        links = top_links_blocked(boxes, args.connections, args.tile_size, args.workers)
+        connection_lens, last_pair = connect_junction_boxes(
+            boxes, links, args.connections
+        )
+    elif args.grid and args.connections:
+        links = nearest_links(BoxGrid.from_boxes(boxes))
+        connection_lens, last_pair = connect_junction_boxes(
+            boxes, links, args.connections
+        )
+    elif args.grid:
+        connection_lens, last_pair = span_junction_boxes(boxes)
+    elif args.union_find:
+        links = link_junction_boxes(boxes)
+        connection_lens, last_pair = connect_junction_boxes(
+            boxes, links, args.connections
+        )
+    else:
+        connections, last_pair = wire_junction_boxes(boxes, args.connections)
         connection_lens = [len(c) for c in connections]
+
+    if args.top:
         answer = product(sorted(connection_lens, reverse=True)[: args.top])
     elif last_pair:
         a, b, _ = last_pair
@@ -1,8 +1,12 @@
 #! /usr/bin/env python3
 
 from argparse import ArgumentParser
+from array import array
+from bisect import bisect_right
 from typing import NamedTuple, Iterable, Optional
 from collections import defaultdict
+from itertools import repeat
+import math
 import re
 
 
@@ -21,6 +25,59 @@ class Range(NamedTuple):
     high: int
 
 
+class Outline:
+    # axis-aligned boundary segments, grouped by the shared coordinate
+    def __init__(self):
+        self.rows = defaultdict[int, list[Range]](list)
+        self.columns = defaultdict[int, list[Range]](list)
+        self.row_lows = dict[int, list[int]]()
+        self.column_lows = dict[int, list[int]]()
+
+    def __bool__(self) -> bool:
+        return bool(self.rows or self.columns)
+
+    def __contains__(self, pos: Position) -> bool:
+        x, y = pos
+        return covers(self.rows, self.row_lows, y, x) or covers(
+            self.columns, self.column_lows, x, y
+        )
+
+    def add_segment(self, p1: Position, p2: Position):
+        x1, y1 = p1
+        x2, y2 = p2
+
+        if y1 == y2 and x1 != x2:
+            self.rows[y1].append(min_max(x1, x2))
+        elif x1 == x2:
+            self.columns[x1].append(min_max(y1, y2))
+        else:
+            self.columns[x1].append(Range(y1, y1))
+            self.columns[x2].append(Range(y2, y2))
+
+    def index(self):
+        for segments, lows in (
+            (self.rows, self.row_lows),
+            (self.columns, self.column_lows),
+        ):
+            for key, ranges in segments.items():
+                ranges[:] = merge_ranges(ranges)
+                lows[key] = [low for low, _ in ranges]
+
+    @classmethod
+    def from_tiles(cls, tile_positions: list[Position]) -> "Outline":
+        # assume that the positions are ordered by adjacent
+        outline = cls()
+
+        if tile_positions:
+            p1 = tile_positions[-1]
+            for p2 in tile_positions:
+                outline.add_segment(p1, p2)
+                p1 = p2
+
+        outline.index()
+        return outline
+
+
 def read_tile_positions(tile_map_path: str) -> list[Position]:
     positions = list[Position]()
 
@@ -43,11 +100,120 @@ def find_largest_area_all(tile_positions: list[Position]) -> int:
     )
 
 
+def find_largest_area_hull(tile_positions: list[Position]) -> int:
+    if len(tile_positions) <= 1:
+        return 0
+
+    # only the lowest and highest tile of each column can be a corner
+    y_lows = dict[int, int]()
+    y_highs = dict[int, int]()
+
+    for x, y in tile_positions:
+        y_low = y_lows.get(x)
+        if y_low is None:
+            y_lows[x] = y_highs[x] = y
+        elif y < y_low:
+            y_lows[x] = y
+        elif y > y_highs[x]:
+            y_highs[x] = y
+
+    x_options = sorted(y_lows)
+
+    # mirroring y turns upper-left/lower-right pairs into lower-left/upper-right
+    return max(
+        find_largest_area_staircase(
+            lower_staircase(x_options, y_lows, 1),
+            upper_staircase(x_options, y_highs, 1),
+        ),
+        find_largest_area_staircase(
+            lower_staircase(x_options, y_highs, -1),
+            upper_staircase(x_options, y_lows, -1),
+        ),
+    )
+
+
+def find_largest_area_staircase(lower: list[Position], upper: list[Position]) -> int:
+    return search_staircases(lower, upper, 0, len(lower) - 1, 0, len(upper) - 1)
+
+
+def lower_staircase(
+    x_options: list[int], column_ys: dict[int, int], y_sign: int
+) -> list[Position]:
+    # minimal corners, x ascending and y strictly descending
+    staircase = list[Position]()
+    last_y = math.inf
+
+    for x in x_options:
+        y = y_sign * column_ys[x]
+        if y < last_y:
+            staircase.append(Position(x, y))
+            last_y = y
+
+    return staircase
+
+
+def upper_staircase(
+    x_options: list[int], column_ys: dict[int, int], y_sign: int
+) -> list[Position]:
+    # maximal corners, x ascending and y strictly descending
+    staircase = list[Position]()
+    last_y = -math.inf
+
+    for x in reversed(x_options):
+        y = y_sign * column_ys[x]
+        if y > last_y:
+            staircase.append(Position(x, y))
+            last_y = y
+
+    staircase.reverse()
+    return staircase
+
+
+def search_staircases(
+    lower: list[Position],
+    upper: list[Position],
+    low: int,
+    high: int,
+    opt_low: int,
+    opt_high: int,
+) -> int:
+    # the best upper corner only moves right as the lower corner does
+    if low > high:
+        return 0
+
+    mid = (low + high) // 2
+    corner = lower[mid]
+    best_area = -math.inf
+    best = opt_low
+
+    for j in range(opt_low, opt_high + 1):
+        new_area = staircase_area(corner, upper[j])
+        if new_area >= best_area:
+            best_area = new_area
+            best = j
+
+    return max(
+        int(max(best_area, 0)),
+        search_staircases(lower, upper, low, mid - 1, opt_low, best),
+        search_staircases(lower, upper, mid + 1, high, best, opt_high),
+    )
+
+
+def staircase_area(a: Position, b: Position) -> float:
+    x_dist = b.x - a.x + 1
+    y_dist = b.y - a.y + 1
+
+    if x_dist < 0 and y_dist < 0:
+        return -math.inf
+
+    return x_dist * y_dist
+
+
 def find_largest_area_outline(tile_positions: list[Position]) -> int:
     if len(tile_positions) <= 1:
         return 0
 
-    outline = trace_outline(tile_positions)
+    outline = Outline.from_tiles(tile_positions)
     if not outline:
         return 0
 
@@ -104,19 +270,123 @@ def find_largest_area_outline(tile_positions: list[Position]) -> int:
     return max_area
 
 
+def find_largest_area_summed(tile_positions: list[Position]) -> int:
+    if len(tile_positions) <= 1:
+        return 0
+
+    outline = Outline.from_tiles(tile_positions)
+    if not outline:
+        return 0
+
+    x_options = sorted({x for x, _ in tile_positions})
+    y_options = sorted({y for _, y in tile_positions})
+
+    y_edges = map_edges(tile_positions, y_options)
+    inside_sums = sum_inside_map(outline, x_options, y_options, y_edges)
+    width = len(x_options) + 1
+
+    x_indices = {x: i for i, x in enumerate(x_options)}
+    y_indices = {y: i for i, y in enumerate(y_options)}
+    tile_edges = [edge_index(pos, x_indices, y_indices) for pos in tile_positions]
+
+    max_area = 0
+
+    for i, (ax, ay) in enumerate(tile_positions):
+        a_edge_x, a_edge_y = tile_edges[i]
+
+        for j in range(i + 1, len(tile_positions)):
+            bx, by = tile_positions[j]
+            new_area = (abs(ax - bx) + 1) * (abs(ay - by) + 1)
+            if new_area <= max_area:
+                continue
+
+            # inlined min_max, this is the hot loop
+            b_edge_x, b_edge_y = tile_edges[j]
+            start_x, end_x = (
+                (a_edge_x, b_edge_x) if a_edge_x < b_edge_x else (b_edge_x, a_edge_x)
+            )
+            start_y, end_y = (
+                (a_edge_y, b_edge_y) if a_edge_y < b_edge_y else (b_edge_y, a_edge_y)
+            )
+
+            inside_count = (
+                inside_sums[(end_y + 1) * width + end_x + 1]
+                - inside_sums[start_y * width + end_x + 1]
+                - inside_sums[(end_y + 1) * width + start_x]
+                + inside_sums[start_y * width + start_x]
+            )
+
+            if inside_count == (end_x - start_x + 1) * (end_y - start_y + 1):
+                max_area = new_area
+
+    return max_area
+
+
+def sum_inside_map(
+    outline: Outline,
+    x_options: list[int],
+    y_options: list[int],
+    y_edges: dict[int, list[int]],
+) -> array:
+    # summed-area table over the compressed grid, one padding row and column
+    width = len(x_options) + 1
+    inside_sums = array("q", repeat(0, width * (len(y_options) + 1)))
+
+    for y_index, y in enumerate(y_options):
+        edges = y_edges.get(y, ())
+        crossed = 0
+        row_count = 0
+
+        above = y_index * width
+        here = above + width
+
+        for x_index, x in enumerate(x_options):
+            while crossed < len(edges) and edges[crossed] <= x:
+                crossed += 1
+
+            if (len(edges) - crossed) & 1 or Position(x, y) in outline:
+                row_count += 1
+
+            inside_sums[here + x_index + 1] = (
+                inside_sums[above + x_index + 1] + row_count
+            )
+
+    return inside_sums
+
+
 def is_inside(x: int, y: int, y_edges: dict[int, list[int]]) -> bool:
     edges = y_edges.get(y, None)
     if not edges:
         return False
 
-    hits = 0
-    for ex in edges:
-        if ex > x:
-            hits += 1
-
+    hits = len(edges) - bisect_right(edges, x)
     return hits & 1 == 1
 
 
+def covers(
+    segments: dict[int, list[Range]], lows: dict[int, list[int]], key: int, value: int
+) -> bool:
+    key_lows = lows.get(key, None)
+    if not key_lows:
+        return False
+
+    i = bisect_right(key_lows, value) - 1
+    return i >= 0 and segments[key][i].high >= value
+
+
+def merge_ranges(ranges: list[Range]) -> list[Range]:
+    merged = list[Range]()
+
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1].high:
+            if high > merged[-1].high:
+                merged[-1] = Range(merged[-1].low, high)
+        else:
+            merged.append(Range(low, high))
+
+    return merged
+
+
 def min_max(a: int, b: int) -> Range:
     low = min(a, b)
     high = max(a, b)
@@ -198,12 +468,14 @@ def map_edges(tiles: list[Position], ys: list[int]) -> dict[int, list[int]]:
 
         if x1 == x2:
             start_y, end_y = min_max(y1, y2)
-            for ey in ys:
-                if start_y < ey <= end_y:
-                    y_edges[ey].append(x1)
+            for i in range(bisect_right(ys, start_y), bisect_right(ys, end_y)):
+                y_edges[ys[i]].append(x1)
 
         p1 = p2
 
+    for edges in y_edges.values():
+        edges.sort()
+
     return y_edges
 
 
@@ -211,12 +483,19 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("tile_map")
     parser.add_argument("-o", "--outline", action="store_true")
+    parser.add_argument("-s", "--summed", action="store_true")
+    parser.add_argument("-c", "--hull", action="store_true")
     args = parser.parse_args()
 
     positions = read_tile_positions(args.tile_map)
-    max_area = (
-        find_largest_area_outline(positions)
-        if args.outline
-        else find_largest_area_all(positions)
-    )
+
+    if args.outline and args.summed:
+        max_area = find_largest_area_summed(positions)
+    elif args.outline:
+        max_area = find_largest_area_outline(positions)
+    elif args.hull:
+        max_area = find_largest_area_hull(positions)
+    else:
+        max_area = find_largest_area_all(positions)
+
     print(max_area)